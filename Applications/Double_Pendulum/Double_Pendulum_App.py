@@ -1,34 +1,213 @@
+import functools
+import math
+from types import SimpleNamespace
 import numpy as np
 import matplotlib.pyplot as plt
+import plotly.graph_objects as go
 from scipy.integrate import solve_ivp
+from numba import njit, cfunc, carray
 import streamlit as st
 
 # Constants
 g = 9.81  # Acceleration due to gravity (m/s^2)
 
+@njit('UniTuple(f8, 2)(f8, f8, f8, f8, f8, f8, f8, f8)', cache=True, fastmath=True)
+def _accelerations(theta1, z1, theta2, z2, L1, L2, m1, m2):
+    c, s = math.cos(theta1 - theta2), math.sin(theta1 - theta2)
+    g1, g2 = g * math.sin(theta1), g * math.sin(theta2)
+    M = m1 + m2
+    D = m1 + m2 * s * s
+    a1 = L1 * z1 * z1
+    a2 = L2 * z2 * z2
+    z1dot = (m2 * g2 * c - m2 * s * (a1 * c + a2) - M * g1) / (L1 * D)
+    z2dot = (M * (a1 * s - g2 + g1 * c) + m2 * a2 * s * c) / (L2 * D)
+    return z1dot, z2dot
+
+@njit('void(f8, f8, f8, f8, f8, f8, f8, f8, f8[::1])', cache=True, fastmath=True)
+def _rhs_core(theta1, z1, theta2, z2, L1, L2, m1, m2, out):
+    # Writes the four derivatives into out, which must not alias the state
+    out[0] = z1
+    out[2] = z2
+    out[1], out[3] = _accelerations(theta1, z1, theta2, z2, L1, L2, m1, m2)
+
+@njit('f8[::1](f8, f8[:], f8, f8, f8, f8)', cache=True)
 def equations(t, y, L1, L2, m1, m2):
-    theta1, z1, theta2, z2 = y
-    c, s = np.cos(theta1 - theta2), np.sin(theta1 - theta2)
-    theta1dot = z1
-    z1dot = (m2 * g * np.sin(theta2) * c - m2 * s * (L1 * z1**2 * c + L2 * z2**2) -
-             (m1 + m2) * g * np.sin(theta1)) / L1 / (m1 + m2 * s**2)
-    theta2dot = z2
-    z2dot = ((m1 + m2) * (L1 * z1**2 * s - g * np.sin(theta2) + g * np.sin(theta1) * c) +
-             m2 * L2 * z2**2 * s * c) / L2 / (m1 + m2 * s**2)
-    return [theta1dot, z1dot, theta2dot, z2dot]
-
-def simulate_double_pendulum(y0, t_span, t_eval, L1, L2, m1, m2):
-    solution = solve_ivp(equations, t_span, y0, args=(L1, L2, m1, m2), t_eval=t_eval)
+    # A fresh array per call: scipy's implicit solvers keep references to earlier derivatives
+    dydt = np.empty(4)
+    _rhs_core(y[0], y[1], y[2], y[3], L1, L2, m1, m2, dydt)
+    return dydt
+
+@njit('f8[:, ::1](f8, f8[:], f8, f8, f8, f8)', cache=True)
+def jac(t, y, L1, L2, m1, m2):
+    # Analytical Jacobian of equations, so the implicit solvers skip finite differences
+    theta1, z1, theta2, z2 = y[0], y[1], y[2], y[3]
+    c, s = math.cos(theta1 - theta2), math.sin(theta1 - theta2)
+    s1, c1 = math.sin(theta1), math.cos(theta1)
+    s2, c2 = math.sin(theta2), math.cos(theta2)
+    M = m1 + m2
+    D = m1 + m2 * s * s
+    dD = 2 * m2 * s * c  # dD/dtheta1 = -dD/dtheta2
+    c2d = c * c - s * s  # cos(2 * (theta1 - theta2))
+    a1 = L1 * z1 * z1
+    a2 = L2 * z2 * z2
+    z1dot, z2dot = _accelerations(theta1, z1, theta2, z2, L1, L2, m1, m2)
+
+    J = np.zeros((4, 4))
+    J[0, 1] = 1.0
+    J[2, 3] = 1.0
+    J[1, 0] = (-m2 * g * s2 * s - m2 * (a1 * c2d + a2 * c) - M * g * c1 - z1dot * L1 * dD) / (L1 * D)
+    J[1, 1] = -2 * m2 * s * c * z1 / D
+    J[1, 2] = (m2 * g * (c2 * c + s2 * s) + m2 * (a1 * c2d + a2 * c) + z1dot * L1 * dD) / (L1 * D)
+    J[1, 3] = -2 * m2 * s * L2 * z2 / (L1 * D)
+    J[3, 0] = (M * (a1 * c + g * c1 * c - g * s1 * s) + m2 * a2 * c2d - z2dot * L2 * dD) / (L2 * D)
+    J[3, 1] = 2 * M * L1 * z1 * s / (L2 * D)
+    J[3, 2] = (M * (-a1 * c - g * c2 + g * s1 * s) - m2 * a2 * c2d + z2dot * L2 * dD) / (L2 * D)
+    J[3, 3] = 2 * m2 * z2 * s * c / D
+    return J
+
+@njit('void(f8[::1], f8, f8, f8, f8, f8, f8[:, ::1], f8[::1])', fastmath=True, cache=True)
+def _rk4_step(y, dt, L1, L2, m1, m2, k, stage):
+    # Advances y by one classical RK4 step in place; k (4 x 4) and stage (4) are scratch buffers
+    _rhs_core(y[0], y[1], y[2], y[3], L1, L2, m1, m2, k[0])
+    for i in range(4):
+        stage[i] = y[i] + 0.5 * dt * k[0, i]
+    _rhs_core(stage[0], stage[1], stage[2], stage[3], L1, L2, m1, m2, k[1])
+    for i in range(4):
+        stage[i] = y[i] + 0.5 * dt * k[1, i]
+    _rhs_core(stage[0], stage[1], stage[2], stage[3], L1, L2, m1, m2, k[2])
+    for i in range(4):
+        stage[i] = y[i] + dt * k[2, i]
+    _rhs_core(stage[0], stage[1], stage[2], stage[3], L1, L2, m1, m2, k[3])
+    for i in range(4):
+        y[i] += dt * (k[0, i] + 2 * k[1, i] + 2 * k[2, i] + k[3, i]) / 6
+
+@njit('f8[:, ::1](f8[::1], f8[::1], f8, f8, f8, f8, i8)', fastmath=True, cache=True)
+def integrate(y0, t, L1, L2, m1, m2, substeps):
+    # Classical fixed-step RK4 with substeps steps per output interval, entirely in compiled code
+    y = np.empty((t.size, 4))
+    k = np.empty((4, 4))  # Stage derivatives
+    stage = np.empty(4)  # Intermediate state
+    state = y0.copy()
+    y[0] = state
+    for n in range(t.size - 1):
+        dt = (t[n + 1] - t[n]) / substeps
+        for _ in range(substeps):
+            _rk4_step(state, dt, L1, L2, m1, m2, k, stage)
+        y[n + 1] = state
+    return y
+
+@njit('f8[:, ::1](f8[::1], f8[::1], f8, f8, f8, f8, i8)', fastmath=True, cache=True)
+def integrate_xy(y0, t, L1, L2, m1, m2, substeps):
+    # Same RK4 as integrate, but only the bob positions (rows x1, y1, x2, y2) are stored
+    xy = np.empty((4, t.size))
+    k = np.empty((4, 4))
+    stage = np.empty(4)
+    state = y0.copy()
+    for n in range(t.size):
+        if n > 0:
+            dt = (t[n] - t[n - 1]) / substeps
+            for _ in range(substeps):
+                _rk4_step(state, dt, L1, L2, m1, m2, k, stage)
+        xy[0, n] = L1 * math.sin(state[0])
+        xy[1, n] = -L1 * math.cos(state[0])
+        xy[2, n] = xy[0, n] + L2 * math.sin(state[2])
+        xy[3, n] = xy[1, n] - L2 * math.cos(state[2])
+    return xy
+
+@njit('void(f8[:, ::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[:, ::1])', cache=True, fastmath=True)
+def _rhs_batch(y, L1, L2, m1, m2, out):
+    # y and out have shape (4, K); the loop runs over contiguous lanes so it can be vectorized
+    for j in range(y.shape[1]):
+        out[0, j] = y[1, j]
+        out[2, j] = y[3, j]
+        out[1, j], out[3, j] = _accelerations(y[0, j], y[1, j], y[2, j], y[3, j], L1[j], L2[j], m1[j], m2[j])
+
+@njit('f8[:, :, ::1](f8[:, ::1], f8[::1], f8[::1], f8[::1], f8[::1], f8[::1])', fastmath=True, cache=True)
+def integrate_batch(y0, t, L1, L2, m1, m2):
+    # RK4 for K independent pendulums in lockstep on a shared fixed step; y0 has shape (4, K)
+    K = y0.shape[1]
+    y = np.empty((t.size, 4, K))
+    k = np.empty((4, 4, K))  # Stage derivatives
+    stage = np.empty((4, K))  # Intermediate states
+    y[0] = y0
+    for n in range(t.size - 1):
+        dt = t[n + 1] - t[n]
+        _rhs_batch(y[n], L1, L2, m1, m2, k[0])
+        for i in range(4):
+            for j in range(K):
+                stage[i, j] = y[n, i, j] + 0.5 * dt * k[0, i, j]
+        _rhs_batch(stage, L1, L2, m1, m2, k[1])
+        for i in range(4):
+            for j in range(K):
+                stage[i, j] = y[n, i, j] + 0.5 * dt * k[1, i, j]
+        _rhs_batch(stage, L1, L2, m1, m2, k[2])
+        for i in range(4):
+            for j in range(K):
+                stage[i, j] = y[n, i, j] + dt * k[2, i, j]
+        _rhs_batch(stage, L1, L2, m1, m2, k[3])
+        for i in range(4):
+            for j in range(K):
+                y[n + 1, i, j] = y[n, i, j] + dt * (k[0, i, j] + 2 * k[1, i, j] + 2 * k[2, i, j] + k[3, i, j]) / 6
+    return y
+
+# Adaptive integrators that run entirely in compiled code
+numbalsoda_methods = ('dop853', 'lsoda')
+
+@functools.cache
+def _numbalsoda_solver(method):
+    # numbalsoda is only imported, and the C-callable right-hand side only compiled, once one of
+    # its methods is requested; the Streamlit app never needs it
+    import numbalsoda
+
+    @cfunc(numbalsoda.lsoda_sig)
+    def rhs(t, y, dy, p):
+        # p carries (L1, L2, m1, m2)
+        _rhs_core(y[0], y[1], y[2], y[3], p[0], p[1], p[2], p[3], carray(dy, 4))
+
+    return getattr(numbalsoda, method), rhs.address
+
+def simulate_double_pendulum(y0, t_span, t_eval, L1, L2, m1, m2, method='dop853', substeps=10):
+    # The compiled integrators are pinned to contiguous float64 arrays.
+    # substeps only applies to RK4: fixed steps taken between consecutive output times.
+    t = np.ascontiguousarray(t_eval, dtype=np.float64)
+    if method == 'RK4':
+        y = integrate(np.ascontiguousarray(y0, dtype=np.float64), t, L1, L2, m1, m2, substeps)
+        return SimpleNamespace(t=t, y=y.T)
+    if method in numbalsoda_methods:
+        data = np.array([L1, L2, m1, m2], dtype=np.float64)
+        solver, rhs_address = _numbalsoda_solver(method)
+        y, success = solver(rhs_address, np.asarray(y0, dtype=np.float64), t, data=data, rtol=1e-8, atol=1e-8)
+        return SimpleNamespace(t=t, y=y.T, success=success)
+    # Only the implicit solvers use a Jacobian; the explicit ones warn if given the keyword at all
+    options = {'jac': jac} if method in ('Radau', 'BDF', 'LSODA') else {}
+    solution = solve_ivp(equations, t_span, y0, args=(L1, L2, m1, m2), t_eval=t_eval,
+                         method=method, **options)
     return solution
 
-def plot_double_pendulum(solution, L1, L2):
-    theta1, theta2 = solution.y[0], solution.y[2]
-    x1 = L1 * np.sin(theta1)
-    y1 = -L1 * np.cos(theta1)
-    x2 = x1 + L2 * np.sin(theta2)
-    y2 = y1 - L2 * np.cos(theta2)
-    
-    fig, ax = plt.subplots(figsize=(10, 6))
+def simulate_double_pendulum_xy(y0, t_eval, L1, L2, m1, m2, substeps=10):
+    # Bob positions x1, y1, x2, y2 at t_eval, without keeping the angular velocities.
+    # With the app's 0.01 s output grid the default gives an RK4 step of 0.001 s.
+    t = np.ascontiguousarray(t_eval, dtype=np.float64)
+    x1, y1, x2, y2 = integrate_xy(np.ascontiguousarray(y0, dtype=np.float64), t, L1, L2, m1, m2, substeps)
+    return x1, y1, x2, y2
+
+def simulate_double_pendulum_batch(y0_batch, t_eval, L1, L2, m1, m2):
+    # Integrates K initial conditions at once; the parameters may be scalars or length-K sequences.
+    # solution.y[k] has the same (4, N) layout as a single simulate_double_pendulum solution.
+    y0 = np.ascontiguousarray(np.asarray(y0_batch, dtype=np.float64).T)
+    K = y0.shape[1]
+    L1, L2, m1, m2 = (np.full(K, q, dtype=np.float64) for q in (L1, L2, m1, m2))
+    t = np.ascontiguousarray(t_eval, dtype=np.float64)
+    y = integrate_batch(y0, t, L1, L2, m1, m2)
+    return SimpleNamespace(t=t, y=y.transpose(2, 1, 0))
+
+def plot_double_pendulum(x1, y1, x2, y2):
+    # Streamlit reruns the script on every widget change; each session creates its figure only once.
+    # Figures are not thread-safe, so they are not shared between sessions.
+    if 'trajectory_fig' not in st.session_state:
+        st.session_state.trajectory_fig = plt.subplots(figsize=(10, 6))
+    fig, ax = st.session_state.trajectory_fig
+    ax.cla()
     ax.plot(x1, y1, 'r-', label='Pendulum 1', lw=2)
     ax.plot(x2, y2, 'b-', label='Pendulum 2', lw=2)
     ax.legend()
@@ -38,6 +217,38 @@ def plot_double_pendulum(solution, L1, L2):
     ax.grid(True, linestyle='--', alpha=0.7)
     st.pyplot(fig)
 
+def animate_double_pendulum(x1, y1, x2, y2, L1, L2):
+    # Plotly animation played by the browser: the frames are sent once as data and drawn with WebGL
+    stride = 5  # 200 frames at 50 ms play the 10 s run in real time
+    reach = 1.1 * (L1 + L2)
+
+    def rods(k):
+        return go.Scattergl(x=[0, x1[k], x2[k]], y=[0, y1[k], y2[k]], mode='lines+markers',
+                            line=dict(width=3), marker=dict(size=10), showlegend=False)
+
+    fig = go.Figure(
+        data=[rods(0),
+              go.Scattergl(x=x1, y=y1, mode='lines', line=dict(color='red', width=1), opacity=0.5,
+                           name='Pendulum 1'),
+              go.Scattergl(x=x2, y=y2, mode='lines', line=dict(color='blue', width=1), opacity=0.5,
+                           name='Pendulum 2')],
+        frames=[go.Frame(data=[rods(k)], traces=[0]) for k in range(0, len(x1), stride)])
+    fig.update_layout(
+        xaxis=dict(range=[-reach, reach]),
+        yaxis=dict(range=[-reach, reach], scaleanchor='x'),
+        updatemenus=[dict(type='buttons', buttons=[
+            dict(label='Play', method='animate',
+                 args=[None, dict(frame=dict(duration=50, redraw=True), transition=dict(duration=0),
+                                  fromcurrent=True)])])])
+    return fig
+
+@st.cache_data(max_entries=64)
+def cached_simulation(theta1_initial, theta2_initial, L1, L2, m1, m2):
+    # Streamlit reruns the script on every widget change; revisited parameters reuse the stored run
+    y0 = [theta1_initial, 0, theta2_initial, 0]
+    t_eval = np.linspace(0, 10, 1000)
+    return simulate_double_pendulum_xy(y0, t_eval, L1, L2, m1, m2)
+
 # Streamlit App
 st.title('Double Pendulum Simulation')
 
@@ -49,9 +260,9 @@ m1 = st.number_input('Mass 1 (kg)', min_value=0.1, value=1.0, step=0.1)
 m2 = st.number_input('Mass 2 (kg)', min_value=0.1, value=1.0, step=0.1)
 
 if st.button('Simulate'):
-    y0 = [theta1_initial, 0, theta2_initial, 0]
-    t_span = [0, 10]
-    t_eval = np.linspace(0, 10, 1000)
-    
-    solution = simulate_double_pendulum(y0, t_span, t_eval, L1, L2, m1, m2)
-    plot_double_pendulum(solution, L1, L2)
+    # Round to the widget steps so nearby slider positions share a cache entry
+    theta1_initial, theta2_initial, L1, L2, m1, m2 = (round(q, 2) for q in
+                                                      (theta1_initial, theta2_initial, L1, L2, m1, m2))
+    x1, y1, x2, y2 = cached_simulation(theta1_initial, theta2_initial, L1, L2, m1, m2)
+    plot_double_pendulum(x1, y1, x2, y2)
+    st.plotly_chart(animate_double_pendulum(x1, y1, x2, y2, L1, L2))
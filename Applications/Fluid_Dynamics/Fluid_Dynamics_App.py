@@ -1,6 +1,9 @@
+import math
+import os
+import tempfile
 import numpy as np
 import matplotlib.pyplot as plt
-from numba import jit
+from numba import cuda, njit, prange
 from matplotlib.animation import FuncAnimation, PillowWriter
 import streamlit as st
 
@@ -9,13 +12,58 @@ Lx = 2.0  # Length of the domain in the x-direction
 Ly = 1.0  # Length of the domain in the y-direction
 Nx = 200  # Number of grid points in the x-direction
 Ny = 100  # Number of grid points in the y-direction
-dx = Lx / Nx
-dy = Ly / Ny
+dx = np.float32(Lx / Nx)
+dy = np.float32(Ly / Ny)
+
+@st.cache_data
+def make_grid(Lx, Ly, Nx, Ny):
+    x = np.linspace(0, Lx, Nx)
+    y = np.linspace(0, Ly, Ny)
+    X, Y = np.meshgrid(x, y)
+    return x, y, X, Y
+
+@st.cache_data
+def make_mask(shape, Lx, Ly, Nx, Ny):
+    _, _, X, Y = make_grid(Lx, Ly, Nx, Ny)
+
+    # Define the object parameters
+    object_center = (0.5, 0.5)
+
+    if shape == "circle":
+        radius = 0.1
+        object_mask = (X - object_center[0])**2 + (Y - object_center[1])**2 < radius**2
+    elif shape == "square":
+        side = 0.2
+        object_mask = (abs(X - object_center[0]) < side / 2) & (abs(Y - object_center[1]) < side / 2)
+    elif shape == "ellipse":
+        a = 0.2  # Semi-major axis
+        b = 0.1  # Semi-minor axis
+        object_mask = ((X - object_center[0])**2 / a**2) + ((Y - object_center[1])**2 / b**2) < 1
+    elif shape == "car":
+        # Approximate a car shape using rectangles and circles
+        car_body = (abs(X - object_center[0]) < 0.1) & (abs(Y - object_center[1]) < 0.05)
+        car_hood = (abs(X - object_center[0]) < 0.05) & (abs(Y - (object_center[1] + 0.05)) < 0.05)
+        car_wheels = ((X - (object_center[0] - 0.05))**2 + (Y - (object_center[1] - 0.05))**2 < 0.02**2) | \
+                     ((X - (object_center[0] + 0.05))**2 + (Y - (object_center[1] - 0.05))**2 < 0.02**2)
+        object_mask = car_body | car_hood | car_wheels
+    elif shape == "plane":
+        # Approximate a plane shape using rectangles and triangles
+        plane_body = (abs(X - object_center[0]) < 0.1) & (abs(Y - object_center[1]) < 0.02)
+        plane_wing1 = (abs(X - object_center[0]) < 0.02) & (abs(Y - (object_center[1] + 0.1)) < 0.02)
+        plane_wing2 = (abs(X - object_center[0]) < 0.02) & (abs(Y - (object_center[1] - 0.1)) < 0.02)
+        plane_tail = (abs(X - (object_center[0] + 0.08)) < 0.02) & (abs(Y - (object_center[1] + 0.05)) < 0.02)
+        object_mask = plane_body | plane_wing1 | plane_wing2 | plane_tail
+    else:
+        return None
+
+    return object_mask
 
 # Create the mesh grid
-x = np.linspace(0, Lx, Nx)
-y = np.linspace(0, Ly, Ny)
-X, Y = np.meshgrid(x, y)
+x, y, X, Y = make_grid(Lx, Ly, Nx, Ny)
+
+# Tile sizes (rows x columns) for the cache-blocked velocity stencil
+BJ = 32
+BI = 64
 
 # Streamlit app layout
 st.title("Computational Fluid Dynamics (CFD) Simulation")
@@ -51,158 +99,431 @@ show_streamlines = st.sidebar.checkbox("Show streamlines", value=True)
 nu = st.sidebar.slider(r"Kinematic viscosity ($\eta$)", min_value=0.001, max_value=0.1, value=0.01, step=0.001)
 inlet_velocity = st.sidebar.slider("Inlet velocity", min_value=0.1, max_value=5.0, value=1.0, step=0.1)
 shape = st.sidebar.selectbox("Choose object shape", ["circle", "square", "ellipse", "car", "plane"])
+use_gpu = False
+if cuda.is_available():
+    use_gpu = st.sidebar.checkbox("Solve pressure on the GPU (CUDA)", value=False)
 
 if st.sidebar.button("Run Simulation"):
-    # Define the object parameters
-    object_center = (0.5, 0.5)
-
-    if shape == "circle":
-        radius = 0.1
-        object_mask = (X - object_center[0])**2 + (Y - object_center[1])**2 < radius**2
-    elif shape == "square":
-        side = 0.2
-        object_mask = (abs(X - object_center[0]) < side / 2) & (abs(Y - object_center[1]) < side / 2)
-    elif shape == "ellipse":
-        a = 0.2  # Semi-major axis
-        b = 0.1  # Semi-minor axis
-        object_mask = ((X - object_center[0])**2 / a**2) + ((Y - object_center[1])**2 / b**2) < 1
-    elif shape == "car":
-        # Approximate a car shape using rectangles and circles
-        car_body = (abs(X - object_center[0]) < 0.1) & (abs(Y - object_center[1]) < 0.05)
-        car_hood = (abs(X - object_center[0]) < 0.05) & (abs(Y - (object_center[1] + 0.05)) < 0.05)
-        car_wheels = ((X - (object_center[0] - 0.05))**2 + (Y - (object_center[1] - 0.05))**2 < 0.02**2) | \
-                     ((X - (object_center[0] + 0.05))**2 + (Y - (object_center[1] - 0.05))**2 < 0.02**2)
-        object_mask = car_body | car_hood | car_wheels
-    elif shape == "plane":
-        # Approximate a plane shape using rectangles and triangles
-        plane_body = (abs(X - object_center[0]) < 0.1) & (abs(Y - object_center[1]) < 0.02)
-        plane_wing1 = (abs(X - object_center[0]) < 0.02) & (abs(Y - (object_center[1] + 0.1)) < 0.02)
-        plane_wing2 = (abs(X - object_center[0]) < 0.02) & (abs(Y - (object_center[1] - 0.1)) < 0.02)
-        plane_tail = (abs(X - (object_center[0] + 0.08)) < 0.02) & (abs(Y - (object_center[1] + 0.05)) < 0.02)
-        object_mask = plane_body | plane_wing1 | plane_wing2 | plane_tail
-    else:
+    object_mask = make_mask(shape, Lx, Ly, Nx, Ny)
+    if object_mask is None:
         st.error("Invalid shape! Please choose from circle, square, ellipse, car, or plane.")
         st.stop()
 
-    object_indices = np.where(object_mask)
-
-    # Initialize velocity and pressure fields
-    u = np.zeros((Ny, Nx))  # x-velocity
-    v = np.zeros((Ny, Nx))  # y-velocity
-    p = np.zeros((Ny, Nx))  # pressure
-
-    # Initialize parameters
-    rho = 1.0  # Density
-    dt = 0.0001  # Time step size
-
-    @jit(nopython=True)
-    def compute_velocity(u, v, p, dx, dy, dt, rho, nu, Nx, Ny, object_indices, inlet_velocity):
-        un = u.copy()
-        vn = v.copy()
-
-        # Compute the velocity field
-        for i in range(1, Nx-1):
-            for j in range(1, Ny-1):
-                u[j, i] = un[j, i] - dt * (un[j, i] * (un[j, i] - un[j, i-1]) / dx +
-                                            vn[j, i] * (un[j, i] - un[j-1, i]) / dy) - \
-                          dt / (2 * rho * dx) * (p[j, i+1] - p[j, i-1]) + \
-                          nu * dt * ((un[j, i+1] - 2 * un[j, i] + un[j, i-1]) / dx**2 +
-                                     (un[j+1, i] - 2 * un[j, i] + un[j-1, i]) / dy**2)
-
-                v[j, i] = vn[j, i] - dt * (un[j, i] * (vn[j, i] - vn[j, i-1]) / dx +
-                                            vn[j, i] * (vn[j, i] - vn[j-1, i]) / dy) - \
-                          dt / (2 * rho * dy) * (p[j+1, i] - p[j-1, i]) + \
-                          nu * dt * ((vn[j, i+1] - 2 * vn[j, i] + vn[j, i-1]) / dx**2 +
-                                     (vn[j+1, i] - 2 * vn[j, i] + vn[j-1, i]) / dy**2)
-
-        # Apply boundary conditions
-        u[:, 0] = inlet_velocity  # Inlet velocity
-        u[:, -1] = 0.0  # Outlet
-        v[:, 0] = 0.0
-        v[:, -1] = 0.0
-        u[0, :] = 0.0
-        u[-1, :] = 0.0
-        v[0, :] = 0.0
-        v[-1, :] = 0.0
-
-        # Apply object boundary condition (no-slip)
-        for idx in range(len(object_indices[0])):
-            u[object_indices[0][idx], object_indices[1][idx]] = 0.0
-            v[object_indices[0][idx], object_indices[1][idx]] = 0.0
+    # Initialize parameters (as float32 scalars so the kernels do not promote to float64)
+    rho = np.float32(1.0)  # Density
+    dt = np.float32(0.0001)  # Time step size
+    tol = 1e-4  # Relative residual at which the pressure solver stops early
+    max_iter = 50  # Maximum number of pressure solver iterations per time step
+    omega = 1.9  # Over-relaxation factor of the GPU pressure solver
+    gpu_block = 16  # Threads per side of a CUDA thread block
+
+    @njit('UniTuple(f4[:, ::1], 2)(f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], f4, f4, f4, f4, f4, '
+          'i8, i8, b1[:, ::1], f4)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def compute_velocity(u, v, un, vn, p, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity):
+        # Reads the previous velocity from un, vn and overwrites every cell of u, v
+
+        # Hoist the constant coefficients out of the stencil, in the precision of the fields
+        real = u.dtype.type
+        two = real(2)
+        inv_dx = real(1.0 / dx)
+        inv_dy = real(1.0 / dy)
+        inv_dx2 = inv_dx * inv_dx
+        inv_dy2 = inv_dy * inv_dy
+        coef_px = real(dt / (2 * rho * dx))
+        coef_py = real(dt / (2 * rho * dy))
+        nu_dt = real(nu * dt)
+
+        # Compute the velocity field tile by tile so each tile's working set stays in L1;
+        # tiles of rows are independent, so they run in parallel
+        n_tiles = (Ny - 2 + BJ - 1) // BJ
+        for tile in prange(n_tiles):
+            jb = 1 + tile * BJ
+            for ib in range(1, Nx-1, BI):
+                for j in range(jb, min(jb + BJ, Ny-1)):
+                    for i in range(ib, min(ib + BI, Nx-1)):
+                        if object_mask[j, i]:  # No-slip condition inside the object
+                            u[j, i] = 0.0
+                            v[j, i] = 0.0
+                            continue
+
+                        u[j, i] = un[j, i] - dt * (un[j, i] * (un[j, i] - un[j, i-1]) * inv_dx +
+                                                    vn[j, i] * (un[j, i] - un[j-1, i]) * inv_dy) - \
+                                  coef_px * (p[j, i+1] - p[j, i-1]) + \
+                                  nu_dt * ((un[j, i+1] - two * un[j, i] + un[j, i-1]) * inv_dx2 +
+                                           (un[j+1, i] - two * un[j, i] + un[j-1, i]) * inv_dy2)
+
+                        v[j, i] = vn[j, i] - dt * (un[j, i] * (vn[j, i] - vn[j, i-1]) * inv_dx +
+                                                    vn[j, i] * (vn[j, i] - vn[j-1, i]) * inv_dy) - \
+                                  coef_py * (p[j+1, i] - p[j-1, i]) + \
+                                  nu_dt * ((vn[j, i+1] - two * vn[j, i] + vn[j, i-1]) * inv_dx2 +
+                                           (vn[j+1, i] - two * vn[j, i] + vn[j-1, i]) * inv_dy2)
+
+        # Apply boundary conditions: inlet/outlet columns first, then the walls (which own the corners)
+        for j in prange(Ny):
+            u[j, 0] = inlet_velocity  # Inlet velocity
+            u[j, Nx-1] = 0.0  # Outlet
+            v[j, 0] = 0.0
+            v[j, Nx-1] = 0.0
+        for i in prange(Nx):
+            u[0, i] = 0.0
+            u[Ny-1, i] = 0.0
+            v[0, i] = 0.0
+            v[Ny-1, i] = 0.0
 
         return u, v
 
-    @jit(nopython=True)
-    def compute_pressure(u, v, p, dx, dy, dt, rho, Nx, Ny):
-        pn = np.zeros_like(p)
-
-        for _ in range(50):  # Iterative solver for pressure
-            pn = p.copy()
-            p[1:-1, 1:-1] = ((pn[1:-1, 2:] + pn[1:-1, :-2]) * dy**2 +
-                             (pn[2:, 1:-1] + pn[:-2, 1:-1]) * dx**2) / \
-                            (2 * (dx**2 + dy**2)) - \
-                            rho * dx**2 * dy**2 / (2 * (dx**2 + dy**2)) * \
-                            ((u[1:-1, 2:] - u[1:-1, :-2]) / (2 * dx) +
-                             (v[2:, 1:-1] - v[:-2, 1:-1]) / (2 * dy)) / dt
-
-            # Boundary conditions for pressure
-            p[:, -1] = p[:, -2]  # dp/dx = 0 at outlet
-            p[:, 0] = p[:, 1]  # dp/dx = 0 at inlet
-            p[0, :] = p[1, :]  # dp/dy = 0 at top
-            p[-1, :] = p[-2, :]  # dp/dy = 0 at bottom
+    @njit('f4[:, ::1](f4[:, ::1], f4[:, ::1], f4[:, ::1], f4, f4, f4, f4, i8, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def compute_rhs(u, v, b, dx, dy, dt, rho, Nx, Ny):
+        dx2 = dx * dx
+        dy2 = dy * dy
+        real = b.dtype.type
+        inv_2dx = real(1.0 / (2 * dx))
+        inv_2dy = real(1.0 / (2 * dy))
+        coef = real(rho * dx2 * dy2 / (2 * (dx2 + dy2)) / dt)  # Folds the pressure update's source coefficient into b
+
+        # Divergence of the provisional velocity field, shifted by one cell (b[j-1, i-1] <-> p[j, i])
+        for j in prange(1, Ny-1):
+            for i in range(1, Nx-1):
+                b[j-1, i-1] = coef * ((u[j, i+1] - u[j, i-1]) * inv_2dx +
+                                      (v[j+1, i] - v[j-1, i]) * inv_2dy)
+
+        return b
+
+    @njit('void(f4[:, ::1], f4[:, ::1], f4, f4, i8, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def apply_poisson(x, out, cx, cy, Nx, Ny):
+        # Scaled 5-point Laplacian, out = x - cx * (x_w + x_e) - cy * (x_s + x_n), on the interior.
+        # The Neumann ghost cells equal their interior neighbour, so they fold into the diagonal.
+        for j in prange(1, Ny-1):
+            for i in range(1, Nx-1):
+                xc = x[j, i]
+                xw = x[j, i-1] if i > 1 else xc
+                xe = x[j, i+1] if i < Nx-2 else xc
+                xs = x[j-1, i] if j > 1 else xc
+                xn = x[j+1, i] if j < Ny-2 else xc
+                out[j, i] = xc - cx * (xw + xe) - cy * (xs + xn)
+
+    @njit('void(f4[:, ::1], f4[:, ::1], f4, f4, i8, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def precondition(r, z, cx, cy, Nx, Ny):
+        # Symmetric red-black Gauss-Seidel (red, black, red sweeps) on apply_poisson(z) = r from z = 0
+        for j in prange(Ny):
+            for i in range(Nx):
+                z[j, i] = 0.0
+
+        for color in (0, 1, 0):
+            for j in prange(1, Ny-1):
+                # First interior column with (i + j) % 2 == color
+                for i in range(1 + (1 + j + color) % 2, Nx-1, 2):
+                    diag = r.dtype.type(1)
+                    acc = r[j, i]
+                    if i > 1:
+                        acc += cx * z[j, i-1]
+                    else:
+                        diag -= cx
+                    if i < Nx-2:
+                        acc += cx * z[j, i+1]
+                    else:
+                        diag -= cx
+                    if j > 1:
+                        acc += cy * z[j-1, i]
+                    else:
+                        diag -= cy
+                    if j < Ny-2:
+                        acc += cy * z[j+1, i]
+                    else:
+                        diag -= cy
+                    z[j, i] = acc / diag
+
+    @njit('f8(f4[:, ::1], f4[:, ::1], i8, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def interior_dot(x, y, Nx, Ny):
+        total = 0.0
+        for j in prange(1, Ny-1):
+            for i in range(1, Nx-1):
+                total += x[j, i] * y[j, i]
+        return total
+
+    @njit('f4[:, ::1](f4[:, ::1], f4[:, ::1], f4[:, :, ::1], f4, f4, i8, i8, f8, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def compute_pressure(b, p, work, dx, dy, Nx, Ny, tol, max_iter):
+        # Preconditioned conjugate gradient on apply_poisson(p) = -b, warm-started from the previous p
+        dx2 = dx * dx
+        dy2 = dy * dy
+        real = p.dtype.type
+        denom = 1.0 / (2 * (dx2 + dy2))
+        cx = real(dy2 * denom)
+        cy = real(dx2 * denom)
+        r, z, d, q = work[0], work[1], work[2], work[3]
+
+        # The Neumann problem is singular, so project the residual onto zero mean to keep it consistent
+        apply_poisson(p, q, cx, cy, Nx, Ny)
+        mean_r = 0.0
+        mean_b = 0.0
+        for j in prange(1, Ny-1):
+            for i in range(1, Nx-1):
+                r[j, i] = -b[j-1, i-1] - q[j, i]
+                mean_r += r[j, i]
+                mean_b += b[j-1, i-1]
+        n_interior = (Nx - 2) * (Ny - 2)
+        mean_r /= n_interior
+        mean_b /= n_interior
+        b_norm2 = 0.0
+        for j in prange(1, Ny-1):
+            for i in range(1, Nx-1):
+                r[j, i] -= mean_r
+                b_norm2 += (b[j-1, i-1] - mean_b) ** 2
+        threshold = tol * tol * b_norm2
+
+        precondition(r, z, cx, cy, Nx, Ny)
+        d[:, :] = z
+        rz = interior_dot(r, z, Nx, Ny)
+        r_norm2 = interior_dot(r, r, Nx, Ny)
+
+        for _ in range(max_iter):
+            if r_norm2 <= threshold:
+                break
+            apply_poisson(d, q, cx, cy, Nx, Ny)
+            dq = interior_dot(d, q, Nx, Ny)
+            if not (dq > 0.0 and rz != 0.0):  # Breakdown once the flow has blown up; leave p as it is
+                break
+            alpha = real(rz / dq)
+            r_norm2 = 0.0
+            for j in prange(1, Ny-1):
+                for i in range(1, Nx-1):
+                    p[j, i] += alpha * d[j, i]
+                    r[j, i] -= alpha * q[j, i]
+                    r_norm2 += r[j, i] * r[j, i]
+
+            precondition(r, z, cx, cy, Nx, Ny)
+            rz_new = interior_dot(r, z, Nx, Ny)
+            beta = real(rz_new / rz)  # rz is nonzero: checked before alpha
+            rz = rz_new
+            for j in prange(1, Ny-1):
+                for i in range(1, Nx-1):
+                    d[j, i] = z[j, i] + beta * d[j, i]
+
+        # Boundary conditions for pressure
+        for j in prange(Ny):
+            p[j, Nx-1] = p[j, Nx-2]  # dp/dx = 0 at outlet
+            p[j, 0] = p[j, 1]  # dp/dx = 0 at inlet
+        for i in prange(Nx):
+            p[0, i] = p[1, i]  # dp/dy = 0 at top
+            p[Ny-1, i] = p[Ny-2, i]  # dp/dy = 0 at bottom
+
+        return p
 
+    @njit('UniTuple(f4[:, ::1], 3)(f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], '
+          'f4[:, :, ::1], f4, f4, f4, f4, f4, i8, i8, b1[:, ::1], f4, f8, i8)',
+          fastmath=True, cache=True, boundscheck=False)
+    def step(u, v, un, vn, p, b, work, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity, tol, max_iter):
+        # One substep in a single compiled call: provisional velocity, Poisson RHS, pressure solve.
+        # The RHS is built once per substep and only read by the pressure solver. The solver settings are
+        # arguments: numba would freeze globals into the cached machine code.
+        u, v = compute_velocity(u, v, un, vn, p, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity)
+        compute_rhs(u, v, b, dx, dy, dt, rho, Nx, Ny)
+        p = compute_pressure(b, p, work, dx, dy, Nx, Ny, tol, max_iter)
+        return u, v, p
+
+    @cuda.jit
+    def rb_sor_kernel(p, b, color, omega, dx2, dy2, denom):
+        # One thread per cell; only the cells of the given color are relaxed
+        i, j = cuda.grid(2)
+        Ny, Nx = p.shape
+        if 1 <= i < Nx-1 and 1 <= j < Ny-1 and (i + j) % 2 == color:
+            p_new = ((p[j, i+1] + p[j, i-1]) * dy2 +
+                     (p[j+1, i] + p[j-1, i]) * dx2) * denom - b[j-1, i-1]
+            p[j, i] += omega * (p_new - p[j, i])
+
+    @cuda.jit
+    def pressure_bc_kernel(p):
+        # Neumann boundaries. The corners read the interior diagonal directly, which is what the
+        # column pass would have copied next to them, so no ordering between threads is needed.
+        k = cuda.grid(1)
+        Ny, Nx = p.shape
+        if k < Ny:
+            p[k, Nx-1] = p[k, Nx-2]  # dp/dx = 0 at outlet
+            p[k, 0] = p[k, 1]  # dp/dx = 0 at inlet
+        if k < Nx:
+            c = min(max(k, 1), Nx-2)
+            p[0, k] = p[1, c]  # dp/dy = 0 at top
+            p[Ny-1, k] = p[Ny-2, c]  # dp/dy = 0 at bottom
+
+    def compute_pressure_gpu(b, p, d_b, d_p, dx, dy, omega, max_iter):
+        # Red-black SOR on the device. b and p cross the bus once per substep; the sweeps stay on the GPU.
+        dx2 = dx * dx
+        dy2 = dy * dy
+        denom = np.float32(1.0 / (2 * (dx2 + dy2)))
+        omega = np.float32(omega)
+        blocks = ((Nx + gpu_block - 1) // gpu_block, (Ny + gpu_block - 1) // gpu_block)
+        threads = (gpu_block, gpu_block)
+        bc_blocks = (max(Nx, Ny) + gpu_block * gpu_block - 1) // (gpu_block * gpu_block)
+
+        d_b.copy_to_device(b)
+        d_p.copy_to_device(p)
+        for _ in range(max_iter):
+            for color in range(2):
+                rb_sor_kernel[blocks, threads](d_p, d_b, color, omega, dx2, dy2, denom)
+            pressure_bc_kernel[bc_blocks, gpu_block * gpu_block](d_p)
+        d_p.copy_to_host(p)
         return p
 
+    def step_gpu(u, v, un, vn, p, b, d_b, d_p, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity,
+                 omega, max_iter):
+        # Same substep as step, with the pressure solve offloaded to the GPU
+        u, v = compute_velocity(u, v, un, vn, p, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity)
+        compute_rhs(u, v, b, dx, dy, dt, rho, Nx, Ny)
+        p = compute_pressure_gpu(b, p, d_b, d_p, dx, dy, omega, max_iter)
+        return u, v, p
+
+    @njit('f4[:, ::1](f4[:, ::1], f4[:, ::1], f4[:, ::1])',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def compute_speed(u, v, speed):
+        # Velocity magnitude written into a preallocated buffer (no temporaries)
+        for j in prange(u.shape[0]):
+            for i in range(u.shape[1]):
+                speed[j, i] = math.sqrt(u[j, i] * u[j, i] + v[j, i] * v[j, i])
+        return speed
+
+    @njit('f4[:, ::1](f4[:, ::1], f4[:, ::1], f4[:, ::1], f4[:, ::1], f4, f4, i8)',
+          parallel=True, fastmath=True, cache=True, boundscheck=False)
+    def compute_lic(u, v, noise, texture, dx, dy, length):
+        # Line integral convolution: average the noise texture along the streamline through each cell,
+        # tracing half a cell per step both downstream and upstream
+        Ny, Nx = u.shape
+        for j in prange(Ny):
+            for i in range(Nx):
+                total = noise[j, i]
+                count = 1
+                for direction in (-0.5, 0.5):
+                    px = i + 0.5
+                    py = j + 0.5
+                    for _ in range(length):
+                        gx = u[int(py), int(px)] / dx
+                        gy = v[int(py), int(px)] / dy
+                        norm = math.sqrt(gx * gx + gy * gy)
+                        if norm == 0:
+                            break
+                        px += direction * gx / norm
+                        py += direction * gy / norm
+                        if px < 0 or px >= Nx or py < 0 or py >= Ny:
+                            break
+                        total += noise[int(py), int(px)]
+                        count += 1
+                texture[j, i] = total / count
+        return texture
+
     # Time-stepping loop parameters
     nt = 2000  # Number of time steps
     n_interval = 10  # Interval for frames in the animation
+    lic_length = 20  # Streamline steps traced in each direction for the LIC texture
+    lic_interval = 5  # Interval (in frames) for recomputing the LIC texture
+
+    @st.cache_data(show_spinner=False, max_entries=8)  # About 19 MB of frames per entry
+    def run_simulation(shape, nu, inlet_velocity, nt, n_interval, use_gpu):
+        # Runs the time-stepping loop and returns the speed of every animation frame, the LIC texture
+        # of every lic_interval-th frame and the final velocity. Cached on the parameters, so revisiting a parameter set
+        # skips the simulation entirely.
+        progress_bar = st.progress(0)
+        object_mask = make_mask(shape, Lx, Ly, Nx, Ny)
+        nu = np.float32(nu)
+        inlet_velocity = np.float32(inlet_velocity)
+
+        # Initialize velocity and pressure fields
+        # Single precision halves the memory traffic of the bandwidth-bound stencils
+        u = np.zeros((Ny, Nx), dtype=np.float32)  # x-velocity
+        v = np.zeros((Ny, Nx), dtype=np.float32)  # y-velocity
+        p = np.zeros((Ny, Nx), dtype=np.float32)  # pressure
+        b = np.zeros((Ny-2, Nx-2), dtype=np.float32)  # right-hand side of the pressure Poisson equation
+        un = np.empty_like(u)  # Read buffers for double-buffering the velocity field
+        vn = np.empty_like(v)
+        work = np.empty((4, Ny, Nx), dtype=np.float32)  # Residual, preconditioned residual, direction, product
+        if use_gpu:
+            d_p = cuda.to_device(p)  # Device copies of the pressure and its right-hand side
+            d_b = cuda.to_device(b)
+
+        n_frames = nt // n_interval
+        speeds = np.empty((n_frames, Ny, Nx), dtype=np.float32)
+        textures = np.empty(((n_frames + lic_interval - 1) // lic_interval, Ny, Nx), dtype=np.float32)
+        noise = np.random.default_rng(0).random((Ny, Nx), dtype=np.float32)
+
+        for frame in range(n_frames):
+            for _ in range(n_interval):
+                # Swap buffers: the current velocity becomes the read buffer and is not copied
+                u, un = un, u
+                v, vn = vn, v
+                if use_gpu:
+                    u, v, p = step_gpu(u, v, un, vn, p, b, d_b, d_p, dx, dy, dt, rho, nu, Nx, Ny,
+                                       object_mask, inlet_velocity, omega, max_iter)
+                else:
+                    u, v, p = step(u, v, un, vn, p, b, work, dx, dy, dt, rho, nu, Nx, Ny, object_mask, inlet_velocity,
+                                   tol, max_iter)
+            compute_speed(u, v, speeds[frame])
+            if not np.isfinite(speeds[frame]).all():  # Diverged: mark the remaining frames and stop
+                speeds[frame:] = np.nan
+                break
+            if frame % lic_interval == 0:  # The flow changes little between textures
+                compute_lic(u, v, noise, textures[frame // lic_interval], dx, dy, lic_length)
 
-    # Create the animation
-    def create_animation(u, v, X, Y, object_mask, nt, n_interval, show_streamlines, inlet_velocity):
+            # Progress indication
+            if frame % (n_frames // 10) == 0:  # Update progress every 10% of total frames
+                progress_bar.progress(frame * 100 // n_frames)
+
+        progress_bar.progress(100)
+        return speeds, textures, u, v
+
+    # Create the animation from the precomputed frames
+    def create_animation(speeds, textures, X, Y, object_mask, n_interval, show_streamlines):
         fig, ax1 = plt.subplots(figsize=(8, 4))
-        progress_bar = st.progress(0)
+        extent = (x[0], x[-1], y[0], y[-1])
 
-        # Initial plot
-        contourf1 = ax1.contourf(X, Y, np.sqrt(u**2 + v**2), cmap='jet', levels=100, extend='both')
-        quiver1 = ax1.quiver(X[::3, ::3], Y[::3, ::3], u[::3, ::3], v[::3, ::3])
+        # The artists are created once and only their data is updated per frame
+        im = ax1.imshow(speeds[0], extent=extent, origin='lower', cmap='jet',
+                        aspect='auto', interpolation='bilinear', animated=True)
+        artists = [im]
         if show_streamlines:
-            stream = ax1.streamplot(X, Y, u, v, color='k', linewidth=0.5, density=1.5)
+            # Streamlines are drawn as an LIC texture blended over the speed field
+            lic = ax1.imshow(textures[0], extent=extent, origin='lower', cmap='gray', alpha=0.4,
+                             aspect='auto', interpolation='bilinear', animated=True)
+            artists.append(lic)
         ax1.contour(X, Y, object_mask, colors='k', linewidths=2)  # Black boundary for object
 
         def update(frame):
-            global u, v, p
-            for _ in range(n_interval):
-                u, v = compute_velocity(u, v, p, dx, dy, dt, rho, nu, Nx, Ny, object_indices, inlet_velocity)
-                p = compute_pressure(u, v, p, dx, dy, dt, rho, Nx, Ny)
-
-            # Update velocity field
-            for c in ax1.collections:
-                c.remove()
-            ax1.clear()
-            contourf1 = ax1.contourf(X, Y, np.sqrt(u**2 + v**2), cmap='jet', levels=100, extend='both')
-            quiver1 = ax1.quiver(X[::3, ::3], Y[::3, ::3], u[::3, ::3], v[::3, ::3])
-            if show_streamlines:
-                stream = ax1.streamplot(X, Y, u, v, color='k', linewidth=0.5, density=1.5)
-            ax1.contour(X, Y, object_mask, colors='k', linewidths=2)  # Black boundary for object
+            speed = speeds[frame]
+            im.set_data(speed)
+            im.set_clim(speed.min(), speed.max())
+            if show_streamlines and frame % lic_interval == 0:
+                texture = textures[frame // lic_interval]
+                lic.set_data(texture)
+                lic.set_clim(texture.min(), texture.max())
             ax1.set_title(f'Velocity Field (Time step: {frame * n_interval})')
+            return artists
 
-            # Progress indication
-            if frame % (nt // n_interval // 10) == 0:  # Update progress every 10% of total frames
-                progress_bar.progress(frame * 100 // (nt // n_interval))
-
-            if show_streamlines:
-                return contourf1.collections + [quiver1, stream.lines]
-            else:
-                return contourf1.collections + [quiver1]
-
-        ani = FuncAnimation(fig, update, frames=nt // n_interval, blit=True)
+        ani = FuncAnimation(fig, update, frames=len(speeds), blit=True)
         return ani
 
+    @st.cache_data(show_spinner=False, max_entries=16)
+    def render_animation(_speeds, _textures, shape, nu, inlet_velocity, nt, n_interval, use_gpu, show_streamlines):
+        # Encodes the GIF once per parameter set and display toggle and returns its bytes.
+        # The frames are not hashed: they are fully determined by the parameters that follow them.
+        ani = create_animation(_speeds, _textures, X, Y, object_mask, n_interval, show_streamlines)
+        # Matplotlib's writers only take a file name; a private temporary file keeps concurrent sessions apart
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "navier_stokes_simulation.gif")
+            ani.save(path, writer=PillowWriter(fps=24))
+            with open(path, "rb") as f:
+                return f.read()
+
     # Create and display the animation
-    ani = create_animation(u, v, X, Y, object_mask, nt, n_interval, show_streamlines, inlet_velocity)
-    ani.save("navier_stokes_simulation.gif", writer=PillowWriter(fps=24))
+    speeds, textures, u, v = run_simulation(shape, nu, inlet_velocity, nt, n_interval, use_gpu)
+    if not np.isfinite(speeds).all():
+        st.error("The simulation diverged. Try a higher viscosity or a lower inlet velocity.")
+        st.stop()
+    gif = render_animation(speeds, textures, shape, nu, inlet_velocity, nt, n_interval, use_gpu, show_streamlines)
 
-    st.image("navier_stokes_simulation.gif", caption="Fluid Dynamics Simulation")
+    st.image(gif, caption="Fluid Dynamics Simulation")
 
     # Display final plot
     fig, ax1 = plt.subplots(figsize=(8, 4))